@@ -9,15 +9,17 @@ from datetime import datetime, timedelta
 
 # Configurações para Smart TVs
 ALLOWED_IPS = ['127.0.0.1', 'localhost']  # IPs permitidos
-SMART_TV_IPS = []  # Lista para armazenar IPs de Smart TVs
+SMART_TV_IPS = {}  # IPs de Smart TVs registradas, do mais antigo ao mais recente
+MAX_SMART_TV_IPS = 1000
 
 app = Flask(__name__, static_folder='public')
 app.config['SECRET_KEY'] = os.urandom(24)  # Chave secreta para segurança
 
 # Configurar CORS para permitir conexões locais e Smart TVs
+CORS_ORIGINS = ["https://osmarads.onrender.com", "http://localhost:3000", "https://osmarads.onrender.com:3000"]
 CORS(app, resources={
     r"/*": {
-        "origins": ["https://osmarads.onrender.com", "http://localhost:3000", "https://osmarads.onrender.com:3000"],
+        "origins": CORS_ORIGINS,
         "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
         "allow_headers": ["Content-Type", "Authorization", "X-Requested-With"],
         "supports_credentials": True
@@ -27,7 +29,7 @@ CORS(app, resources={
 # Configurar Socket.IO com suporte a Smart TVs e configurações de produção
 socketio = SocketIO(
     app,
-    cors_allowed_origins=["https://osmarads.onrender.com", "http://localhost:3000", "https://osmarads.onrender.com:3000"],
+    cors_allowed_origins=CORS_ORIGINS,
     ping_timeout=60,
     ping_interval=25,
     async_mode='eventlet',
@@ -51,12 +53,322 @@ def is_smart_tv(request):
     user_agent = request.headers.get('User-Agent', '')
     return 'LG' in user_agent or 'webOS' in user_agent
 
+# ---- LIMITE DE REQUISIÇÕES ----
+import math
+import random
+import threading
+import time
+from collections import OrderedDict, deque
+from flask import g
+from werkzeug.middleware.proxy_fix import ProxyFix
+
+RATE_LIMIT_ENABLED = os.environ.get('RATE_LIMIT_ENABLED', '1') != '0'
+# Só com um proxy reverso na frente (Render) o X-Forwarded-For é confiável
+TRUST_PROXY = os.environ.get('TRUST_PROXY', '0') != '0'
+RATE_LIMIT_MAX_CHAVES = 10000  # buckets mantidos em memória (os menos usados são descartados)
+
+# Regras por endpoint: chave do bucket (ip, usuario ou outdoor_ip), taxa em requisições/s,
+# rajada máxima e quantas requisições podem estar em andamento ao mesmo tempo na rota
+RATE_LIMITS = {
+    # Por outdoor e IP: um cliente em loop não bloqueia as demais TVs do outdoor, e a rajada
+# maior cobre várias TVs atrás do mesmo NAT; a resposta vem do cache
+    'get_anuncios_vinculados': {'chave': 'outdoor_ip', 'taxa': 10, 'rajada': 100, 'simultaneas': 50},
+    'list_outdoors': {'chave': 'ip', 'taxa': 2, 'rajada': 10, 'simultaneas': 20},
+    'get_outdoor': {'chave': 'outdoor_ip', 'taxa': 5, 'rajada': 50, 'simultaneas': 20},
+    'list_outdoors_meus': {'chave': 'ip', 'taxa': 2, 'rajada': 10, 'simultaneas': 20},
+    'get_anuncios_meus': {'chave': 'usuario', 'taxa': 2, 'rajada': 10, 'simultaneas': 20},
+    'serve_upload': {'chave': 'ip', 'taxa': 5, 'rajada': 30, 'simultaneas': 100},
+    'create_anuncio': {'chave': 'usuario', 'taxa': 0.2, 'rajada': 5, 'simultaneas': 4},
+    'login': {'chave': 'ip', 'taxa': 0.2, 'rajada': 5, 'simultaneas': 10},
+    'register': {'chave': 'ip', 'taxa': 0.05, 'rajada': 3, 'simultaneas': 5},
+    'register_smart_tv': {'chave': 'ip', 'taxa': 0.05, 'rajada': 3, 'simultaneas': 5},
+    'receber_play_events': {'chave': 'ip', 'taxa': 2, 'rajada': 10, 'simultaneas': 20},
+    'resumo_plays': {'chave': 'ip', 'taxa': 1, 'rajada': 10, 'simultaneas': 5},
+}
+# Demais rotas em /api
+RATE_LIMIT_PADRAO = {'chave': 'ip', 'taxa': 5, 'rajada': 30, 'simultaneas': 20}
+
+# Eventos Socket.IO recebidos dos players (chave sempre a conexão, para não somar TVs atrás do mesmo NAT)
+SOCKET_RATE_LIMITS = {
+    'join_outdoor': {'taxa': 0.5, 'rajada': 5},
+    'play_events': {'taxa': 1, 'rajada': 10},
+}
+
+# Reconexão em massa: acima do limiar de conexões na janela, o servidor pede aos
+# clientes que esperem um atraso aleatório antes de reconectar ou recarregar
+RECONEXAO_JANELA = 10  # segundos
+RECONEXAO_LIMIAR = int(os.environ.get('RECONEXAO_LIMIAR', '50'))
+RECONEXAO_ATRASO_MIN = 2000  # ms
+RECONEXAO_ATRASO_MAX = 30000  # ms
+
+
+class TokenBucket:
+    __slots__ = ('taxa', 'rajada', 'tokens', 'atualizado')
+
+    def __init__(self, taxa, rajada):
+        self.taxa = taxa
+        self.rajada = rajada
+        self.tokens = rajada
+        self.atualizado = time.monotonic()
+
+    def consume(self):
+        """Retorna 0 se a requisição foi liberada ou os segundos até haver uma ficha"""
+        agora = time.monotonic()
+        self.tokens = min(self.rajada, self.tokens + (agora - self.atualizado) * self.taxa)
+        self.atualizado = agora
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.taxa
+
+
+class RateLimiter:
+    """Token buckets por (rota, cliente) e contadores de requisições em andamento por rota"""
+
+    def __init__(self, max_chaves):
+        self.max_chaves = max_chaves
+        self._buckets = OrderedDict()
+        self._em_andamento = {}
+        self._lock = threading.Lock()
+
+    def hit(self, rota, chave, taxa, rajada):
+        with self._lock:
+            bucket = self._buckets.get((rota, chave))
+            if bucket is None:
+                bucket = self._buckets[(rota, chave)] = TokenBucket(taxa, rajada)
+                if len(self._buckets) > self.max_chaves:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end((rota, chave))
+            return bucket.consume()
+
+    def acquire(self, rota, limite):
+        with self._lock:
+            if self._em_andamento.get(rota, 0) >= limite:
+                return False
+            self._em_andamento[rota] = self._em_andamento.get(rota, 0) + 1
+            return True
+
+    def release(self, rota):
+        with self._lock:
+            self._em_andamento[rota] -= 1
+
+    def discard(self, rotas, chave):
+        with self._lock:
+            for rota in rotas:
+                self._buckets.pop((rota, chave), None)
+
+
+rate_limiter = RateLimiter(RATE_LIMIT_MAX_CHAVES)
+# Buckets por conexão Socket.IO ficam à parte, para uma reconexão em massa não descartar os do HTTP
+socket_rate_limiter = RateLimiter(RATE_LIMIT_MAX_CHAVES)
+_conexoes_recentes = deque()
+
+
+if TRUST_PROXY:
+    # O último endereço de X-Forwarded-For (acrescentado pelo proxy) passa a ser o remote_addr
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=1)
+
+
+def client_ip():
+    return request.remote_addr
+
+
+def _chave_limite(tipo):
+    if tipo == 'usuario':
+        auth_header = request.headers.get('Authorization', '')
+        if auth_header.startswith('Bearer '):
+            try:
+                decoded = jwt.decode(auth_header.split(' ')[1], app.config['SECRET_KEY'], algorithms=['HS256'])
+                return 'usuario:' + decoded['email']
+            except (jwt.InvalidTokenError, KeyError):
+                pass
+    elif tipo == 'outdoor_ip':
+        outdoor_id = (request.view_args or {}).get('outdoor_id', (request.view_args or {}).get('id'))
+        if outdoor_id is not None:
+            return f'outdoor:{outdoor_id}:ip:{client_ip()}'
+    return 'ip:' + str(client_ip())
+
+
+def _resposta_limite(mensagem, status, espera):
+    retry_after = max(1, math.ceil(espera))
+    response = jsonify({'error': mensagem, 'retry_after': retry_after})
+    response.status_code = status
+    response.headers['Retry-After'] = str(retry_after)
+    return response
+
+
+@app.before_request
+def aplicar_limites():
+    if not RATE_LIMIT_ENABLED or request.method == 'OPTIONS' or request.endpoint is None:
+        return None
+    regra = RATE_LIMITS.get(request.endpoint)
+    if regra is None:
+        if not request.path.startswith('/api/'):
+            return None
+        regra = RATE_LIMIT_PADRAO
+    espera = rate_limiter.hit(request.endpoint, _chave_limite(regra['chave']), regra['taxa'], regra['rajada'])
+    if espera:
+        return _resposta_limite('Muitas requisições, tente novamente mais tarde', 429, espera)
+    if not rate_limiter.acquire(request.endpoint, regra['simultaneas']):
+        return _resposta_limite('Servidor ocupado, tente novamente', 503, 1)
+    g.limite_em_andamento = request.endpoint
+    return None
+
+
+@app.teardown_request
+def liberar_limites(exc):
+    rota = g.pop('limite_em_andamento', None)
+    if rota:
+        rate_limiter.release(rota)
+
+
+def socket_rate_limited(evento, sid=None):
+    """Retorna 0 se o evento foi liberado ou os segundos que o cliente deve esperar"""
+    regra = SOCKET_RATE_LIMITS.get(evento)
+    if not RATE_LIMIT_ENABLED or regra is None:
+        return 0
+    sid = sid if sid is not None else request.sid
+    return socket_rate_limiter.hit('socket:' + evento, 'sid:' + str(sid), regra['taxa'], regra['rajada'])
+
+
+def esquecer_conexao(sid):
+    """Descarta os buckets de uma conexão Socket.IO encerrada"""
+    socket_rate_limiter.discard(['socket:' + evento for evento in SOCKET_RATE_LIMITS], 'sid:' + str(sid))
+
+
+def resposta_limite_socket(espera):
+    """Ack de erro para eventos Socket.IO limitados; o player tenta de novo depois de retry_after"""
+    return {'error': 'Muitas requisições, tente novamente mais tarde', 'retry_after': max(1, math.ceil(espera))}
+
+
+def reconexao_em_massa():
+    """Registra uma conexão e indica se a janela atual passou do limiar"""
+    agora = time.monotonic()
+    _conexoes_recentes.append(agora)
+    while _conexoes_recentes and agora - _conexoes_recentes[0] > RECONEXAO_JANELA:
+        _conexoes_recentes.popleft()
+    return len(_conexoes_recentes) > RECONEXAO_LIMIAR
+
+# ---- FORMATOS COMPACTOS ----
+# As respostas da API são negociadas pelos cabeçalhos Accept (JSON compacto ou
+# msgpack) e Accept-Encoding (gzip acima de API_GZIP_MIN_BYTES). Clientes com um
+# parser msgpack podem também usar Socket.IO em /socket.io-msgpack; os eventos para
+# os players são emitidos nos dois servidores. msgpack é opcional: sem ele a API
+# responde sempre JSON e apenas o Socket.IO padrão fica disponível.
+import gzip
+import socketio as socketio_lib
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+API_GZIP_MIN_BYTES = int(os.environ.get('API_GZIP_MIN_BYTES', '1024'))
+API_GZIP_LEVEL = 6
+MSGPACK_MIMETYPES = ('application/msgpack', 'application/x-msgpack')
+SOCKETIO_MSGPACK_PATH = 'socket.io-msgpack'
+app.json.compact = True
+
+
+def api_formato():
+    if msgpack is not None and request.accept_mimetypes.best_match(('application/json',) + MSGPACK_MIMETYPES) in MSGPACK_MIMETYPES:
+        return 'msgpack'
+    return 'json'
+
+
+def aceita_gzip():
+    # Respeita q=0 (ex.: "gzip;q=0") e "*"
+    return request.accept_encodings['gzip'] > 0
+
+
+def api_response(data, cache=None, chave=None):
+    """Resposta no formato negociado; com `cache` os corpos codificados são reaproveitados por `chave`.
+    `data` pode ser uma função, chamada só quando o corpo não está no cache. Resultados vazios não são
+    guardados, assim filtros por valores arbitrários (ex.: ?usuario=) não fazem o cache crescer"""
+    formato = api_formato()
+    comprimir = aceita_gzip()
+    codificado = cache.get((chave, formato, comprimir)) if cache is not None else None
+    if codificado is None:
+        if callable(data):
+            data = data()
+        if formato == 'msgpack':
+            corpo = msgpack.packb(data)
+        else:
+            corpo = json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        gz = comprimir and len(corpo) >= API_GZIP_MIN_BYTES
+        if gz:
+            corpo = gzip.compress(corpo, compresslevel=API_GZIP_LEVEL, mtime=0)
+        codificado = (corpo, gz)
+        if cache is not None and data:
+            cache[(chave, formato, comprimir)] = codificado
+    corpo, gz = codificado
+    response = app.response_class(corpo, mimetype='application/msgpack' if formato == 'msgpack' else 'application/json')
+    if gz:
+        response.headers['Content-Encoding'] = 'gzip'
+    response.vary.add('Accept')
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+# Servidor Socket.IO com serializador msgpack para os players que optarem por ele
+if msgpack is not None:
+    socketio_msgpack = socketio_lib.Server(
+        async_mode='eventlet',
+        serializer='msgpack',
+        cors_allowed_origins=CORS_ORIGINS,
+        cors_credentials=True,
+        ping_timeout=60,
+        ping_interval=25,
+        cookie=None,
+        transports=['websocket', 'polling']
+    )
+    app.wsgi_app = socketio_lib.WSGIApp(socketio_msgpack, app.wsgi_app, socketio_path=SOCKETIO_MSGPACK_PATH)
+
+    @socketio_msgpack.on('connect')
+    def handle_connect_msgpack(sid, environ):
+        print('Cliente conectado (msgpack)')
+        if reconexao_em_massa():
+            socketio_msgpack.start_background_task(notify_backoff, sid, socketio_msgpack)
+
+    @socketio_msgpack.on('disconnect')
+    def handle_disconnect_msgpack(sid):
+        esquecer_conexao(sid)
+
+    @socketio_msgpack.on('join_outdoor')
+    def handle_join_outdoor_msgpack(sid, data):
+        espera = socket_rate_limited('join_outdoor', sid)
+        if espera:
+            return resposta_limite_socket(espera)
+        outdoor_id = data.get('outdoor_id')
+        if outdoor_id:
+            socketio_msgpack.enter_room(sid, str(outdoor_id))
+            print(f'Cliente (msgpack) entrou na sala do outdoor {outdoor_id}')
+            return {'ok': True}
+
+    @socketio_msgpack.on('play_events')
+    def handle_play_events_msgpack(sid, data):
+        return processar_play_events(data, sid)
+else:
+    socketio_msgpack = None
+
+
+def emit_players(evento, data, room=None):
+    """Emite um evento para os players nos dois servidores Socket.IO"""
+    socketio.emit(evento, data, room=room)
+    if socketio_msgpack is not None:
+        socketio_msgpack.emit(evento, data, room=room)
+
+
 # Função para registrar Smart TV
 @app.route('/api/smart-tv/register', methods=['POST'])
 def register_smart_tv():
     ip = request.remote_addr
     if is_smart_tv(request):
-        SMART_TV_IPS.append(ip)
+        # Mantém apenas os registros mais recentes
+        SMART_TV_IPS.pop(ip, None)
+        SMART_TV_IPS[ip] = True
+        if len(SMART_TV_IPS) > MAX_SMART_TV_IPS:
+            del SMART_TV_IPS[next(iter(SMART_TV_IPS))]
         return jsonify({'message': 'Smart TV registrada com sucesso'}), 200
     return jsonify({'error': 'Dispositivo não é uma Smart TV'}), 400
 USERS_FILE = os.path.join(os.path.dirname(__file__), 'usuarios.json')
@@ -186,8 +498,17 @@ def serve_upload(filename):
         # Determinar o tipo MIME com base na extensão
         mimetype = 'application/octet-stream'
         ext = filename.lower().split('.')[-1]
+        imagem = ext in IMAGEM_EXTENSOES
         
-        if ext in ['png', 'jpg', 'jpeg', 'gif']:
+        # Para imagens, servir a variante do perfil do outdoor quando existir
+        variante = escolher_variante(filename) if imagem else None
+        if variante:
+            filename = variante
+            ext = variante.split('.')[-1]
+        
+        if ext in ['jpg', 'jpeg']:
+            mimetype = 'image/jpeg'
+        elif ext in ['png', 'gif', 'webp']:
             mimetype = f'image/{ext}'
         elif ext in ['mp4']:
             mimetype = 'video/mp4'
@@ -202,14 +523,22 @@ def serve_upload(filename):
             filename,
             mimetype=mimetype,
             as_attachment=False,
-            conditional=True
+            conditional=True,
+            etag=media_etag(filename)
         )
         
         # Adicionar cabeçalhos de cache e CORS
-        response.headers['Cache-Control'] = 'public, max-age=31536000'  # 1 ano
+        if imagem and (request.args.get('outdoor') or (request.args.get('perfil') and not variante)):
+            # Cache curto: com ?outdoor= a variante depende do tipo do outdoor, que pode mudar,
+            # e o original servido no lugar de uma variante que ainda não existe é provisório
+            response.headers['Cache-Control'] = f'public, max-age={VARIANTE_CACHE_CURTO}'
+        else:
+            response.headers['Cache-Control'] = 'public, max-age=31536000'  # 1 ano
         response.headers['Access-Control-Allow-Origin'] = '*'
         response.headers['Access-Control-Allow-Methods'] = 'GET, OPTIONS'
         response.headers['Access-Control-Allow-Headers'] = 'Content-Type, Authorization'
+        if imagem:
+            response.headers['Vary'] = 'Accept'
         
         return response
         
@@ -222,6 +551,194 @@ def serve_upload(filename):
 def serve_static(filename):
     return send_from_directory('public', filename)
 
+# ---- MODELOS ----
+# Registros tipados de outdoors e anúncios. Toda gravação passa por from_dict(),
+# que valida e normaliza os campos, e to_dict(), que fixa o formato do JSON; assim
+# quem lê os arquivos não precisa reconverter tipos nem lidar com campos extras.
+import sys
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Optional
+
+
+class TipoOutdoor(str, Enum):
+    LED = 'LED'
+    LCD = 'LCD'
+    PROJETOR = 'projetor'
+
+    @classmethod
+    def parse(cls, valor):
+        if isinstance(valor, str):
+            for tipo in cls:
+                if tipo.value.lower() == valor.strip().lower():
+                    return tipo
+        raise ValueError('Tipo deve ser LED, LCD ou projetor')
+
+
+class TipoAnuncio(str, Enum):
+    IMAGEM = 'imagem'
+    VIDEO = 'video'
+
+    @classmethod
+    def parse(cls, valor):
+        if isinstance(valor, str):
+            for tipo in cls:
+                if tipo.value == valor.strip().lower():
+                    return tipo
+        raise ValueError('Tipo deve ser imagem ou video')
+
+
+def _texto(data, campo, obrigatorio=True):
+    valor = data.get(campo)
+    if valor is None and not obrigatorio:
+        return None
+    if not isinstance(valor, str) or not valor.strip():
+        raise ValueError(f'Campo {campo} é obrigatório')
+    return valor.strip()
+
+
+def _duracao(valor):
+    """Duração em segundos inteiros; aceita números e strings como "30" """
+    if valor is None:
+        return None
+    try:
+        duracao = int(float(valor))
+    except (TypeError, ValueError):
+        raise ValueError('Duração deve ser um número de segundos')
+    if duracao <= 0:
+        raise ValueError('Duração deve ser maior que zero')
+    return duracao
+
+
+def normalize_sobrescrita(data):
+    """Sobrescrita local de um anúncio vinculado: apenas título e duração"""
+    if not isinstance(data, dict):
+        raise ValueError('Sobrescrita inválida')
+    return {'titulo': _texto(data, 'titulo'), 'duracao': _duracao(data.get('duracao'))}
+
+
+@dataclass(slots=True)
+class Outdoor:
+    id: int
+    nome: str
+    localizacao: str
+    tipo: TipoOutdoor
+    usuario: str
+    anuncios: list = field(default_factory=list)
+    anuncios_vinculados: dict = field(default_factory=dict)
+
+    EDITAVEIS = ('nome', 'localizacao', 'tipo', 'usuario')
+
+    @classmethod
+    def from_dict(cls, data):
+        anuncios = data.get('anuncios') or []
+        if not isinstance(anuncios, list) or not all(isinstance(a, str) for a in anuncios):
+            raise ValueError('Lista de anúncios inválida')
+        vinculados = data.get('anuncios_vinculados') or {}
+        if not isinstance(vinculados, dict):
+            raise ValueError('Anúncios vinculados inválidos')
+        return cls(
+            id=int(data['id']),
+            nome=_texto(data, 'nome'),
+            localizacao=_texto(data, 'localizacao'),
+            tipo=TipoOutdoor.parse(data.get('tipo')),
+            usuario=sys.intern(_texto(data, 'usuario')),
+            anuncios=[sys.intern(a) for a in anuncios],
+            anuncios_vinculados={sys.intern(aid): normalize_sobrescrita(s)
+                                 for aid, s in vinculados.items() if aid in anuncios}
+        )
+
+    @classmethod
+    def carregar(cls, data):
+        """Como from_dict, mas mantém os valores originais de registros antigos que não passam na validação"""
+        try:
+            return cls.from_dict(data)
+        except (ValueError, KeyError, TypeError, AttributeError):
+            return cls(
+                id=data.get('id'),
+                nome=data.get('nome'),
+                localizacao=data.get('localizacao'),
+                tipo=data.get('tipo'),
+                usuario=data.get('usuario'),
+                anuncios=list(data.get('anuncios') or []),
+                anuncios_vinculados=data['anuncios_vinculados'] if isinstance(data.get('anuncios_vinculados'), dict) else {}
+            )
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'nome': self.nome,
+            'localizacao': self.localizacao,
+            'tipo': getattr(self.tipo, 'value', self.tipo),
+            'usuario': self.usuario,
+            'anuncios': list(self.anuncios),
+            'anuncios_vinculados': {aid: dict(s) if isinstance(s, dict) else s for aid, s in self.anuncios_vinculados.items()}
+        }
+
+
+@dataclass(slots=True)
+class Anuncio:
+    id: str
+    titulo: str
+    tipo: TipoAnuncio
+    duracao: Optional[int]
+    arquivo: Optional[str]
+    usuario: str
+    data_criacao: str
+    ultima_atualizacao: Optional[str] = None
+    variantes: dict = field(default_factory=dict)
+
+    EDITAVEIS = ('titulo', 'tipo', 'duracao')
+
+    @classmethod
+    def from_dict(cls, data):
+        variantes = data.get('variantes') or {}
+        if not isinstance(variantes, dict) or not all(isinstance(f, dict) for f in variantes.values()):
+            raise ValueError('Variantes inválidas')
+        return cls(
+            id=sys.intern(_texto(data, '_id')),
+            titulo=_texto(data, 'titulo'),
+            tipo=TipoAnuncio.parse(data.get('tipo')),
+            duracao=_duracao(data.get('duracao')),
+            arquivo=_texto(data, 'arquivo', obrigatorio=False),
+            usuario=sys.intern(_texto(data, 'usuario')),
+            data_criacao=_texto(data, 'data_criacao'),
+            ultima_atualizacao=_texto(data, 'ultima_atualizacao', obrigatorio=False),
+            variantes={perfil: {formato: str(caminho) for formato, caminho in formatos.items()}
+                       for perfil, formatos in variantes.items()}
+        )
+
+    @classmethod
+    def carregar(cls, data):
+        """Como from_dict, mas mantém os valores originais de registros antigos que não passam na validação"""
+        try:
+            return cls.from_dict(data)
+        except (ValueError, KeyError, TypeError, AttributeError):
+            return cls(
+                id=data.get('_id'),
+                titulo=data.get('titulo'),
+                tipo=data.get('tipo'),
+                duracao=data.get('duracao'),
+                arquivo=data.get('arquivo'),
+                usuario=data.get('usuario'),
+                data_criacao=data.get('data_criacao'),
+                ultima_atualizacao=data.get('ultima_atualizacao'),
+                variantes=data.get('variantes') or {}
+            )
+
+    def to_dict(self):
+        return {
+            '_id': self.id,
+            'titulo': self.titulo,
+            'tipo': getattr(self.tipo, 'value', self.tipo),
+            'duracao': self.duracao,
+            'arquivo': self.arquivo,
+            'usuario': self.usuario,
+            'data_criacao': self.data_criacao,
+            'ultima_atualizacao': self.ultima_atualizacao,
+            'variantes': self.variantes
+        }
+
 # Utilitários para ler/salvar outdoors
 OUTDOORS_FILE = os.path.join(os.path.dirname(__file__), 'outdoors.json')
 def read_outdoors():
@@ -241,43 +758,39 @@ def create_outdoor():
     localizacao = data.get('localizacao')
     tipo = data.get('tipo')
     usuario = data.get('usuario')
-    tipos_validos = ['LED', 'LCD', 'projetor']
     if not nome or not localizacao or not tipo or not usuario:
         return jsonify({'error': 'Todos os campos são obrigatórios'}), 400
-    if tipo.upper() not in ['LED', 'LCD'] and tipo.lower() != 'projetor':
-        return jsonify({'error': 'Tipo deve ser LED, LCD ou projetor'}), 400
-    # Normaliza tipo para manter padrão
-    if tipo.lower() == 'projetor':
-        tipo_final = 'projetor'
-    else:
-        tipo_final = tipo.upper()
     outdoors = read_outdoors()
     new_id = (max([o['id'] for o in outdoors], default=0) + 1) if outdoors else 1
-    outdoor = {
-        'id': new_id,
-        'nome': nome,
-        'localizacao': localizacao,
-        'tipo': tipo_final,
-        'usuario': usuario
-    }
+    try:
+        # Valida e normaliza (ex.: tipo "led" vira "LED")
+        outdoor = Outdoor.from_dict({
+            'id': new_id,
+            'nome': nome,
+            'localizacao': localizacao,
+            'tipo': tipo,
+            'usuario': usuario
+        }).to_dict()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     outdoors.append(outdoor)
     save_outdoors(outdoors)
+    publish_playlists([new_id], outdoors=outdoors)
     return jsonify({'message': 'Outdoor criado com sucesso!', 'outdoor': outdoor}), 201
 
 # Rota para listar todos os outdoors
 @app.route('/api/outdoors', methods=['GET'])
 def list_outdoors():
-    outdoors = read_outdoors()
-    return jsonify(outdoors)
+    catalogo = load_catalogo()
+    return api_response(lambda: [o.to_dict() for o in catalogo['outdoors'].values()], catalogo['corpos'], 'outdoors')
 
 # Rota para obter, editar e deletar outdoor por id
 @app.route('/api/outdoors/<int:id>', methods=['GET'])
 def get_outdoor(id):
-    outdoors = read_outdoors()
-    outdoor = next((o for o in outdoors if o['id'] == id), None)
+    outdoor = load_catalogo()['outdoors'].get(id)
     if not outdoor:
         return jsonify({'error': 'Outdoor não encontrado'}), 404
-    return jsonify(outdoor)
+    return api_response(outdoor.to_dict())
 
 @app.route('/api/outdoors/<int:id>', methods=['PUT'])
 def update_outdoor(id):
@@ -287,9 +800,14 @@ def update_outdoor(id):
     if idx is None:
         return jsonify({'error': 'Outdoor não encontrado'}), 404
     # Atualiza apenas os campos permitidos
-    for campo in ['nome', 'localizacao', 'tipo', 'usuario']:
+    atualizado = dict(outdoors[idx])
+    for campo in Outdoor.EDITAVEIS:
         if campo in data:
-            outdoors[idx][campo] = data[campo]
+            atualizado[campo] = data[campo]
+    try:
+        outdoors[idx] = Outdoor.from_dict(atualizado).to_dict()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     save_outdoors(outdoors)
     return jsonify({'message': 'Outdoor atualizado com sucesso!', 'outdoor': outdoors[idx]})
 
@@ -300,6 +818,7 @@ def delete_outdoor(id):
     if len(new_outdoors) == len(outdoors):
         return jsonify({'error': 'Outdoor não encontrado'}), 404
     save_outdoors(new_outdoors)
+    publish_playlists([id], outdoors=new_outdoors)
     return jsonify({'message': 'Outdoor excluído com sucesso!'})
 
 # Rota para listar outdoors do usuário
@@ -308,9 +827,9 @@ def list_outdoors_meus():
     usuario = request.args.get('usuario')
     if not usuario:
         return jsonify({'error': 'Usuário não informado'}), 400
-    outdoors = read_outdoors()
-    meus = [o for o in outdoors if o.get('usuario') == usuario]
-    return jsonify(meus)
+    catalogo = load_catalogo()
+    meus = [o.to_dict() for o in catalogo['outdoors'].values() if o.usuario == usuario]
+    return api_response(meus, catalogo['corpos'], ('outdoors', usuario))
 
 # Vincular anúncio a outdoor
 @app.route('/api/outdoors/<int:outdoor_id>/anuncios/<anuncio_id>', methods=['POST'])
@@ -334,6 +853,7 @@ def vincular_anuncio(outdoor_id, anuncio_id):
         if anuncio_id not in outdoor['anuncios']:
             outdoor['anuncios'].append(anuncio_id)
             save_outdoors(outdoors)
+            publish_playlists([outdoor_id], outdoors=outdoors, anuncios=anuncios)
             # Notificar players sobre a atualização
             socketio.start_background_task(notify_outdoor_update, outdoor_id)
             
@@ -343,33 +863,49 @@ def vincular_anuncio(outdoor_id, anuncio_id):
         print('Erro ao vincular anúncio:', str(e))
         return jsonify({'error': 'Erro ao vincular anúncio'}), 500
 
+# Playlist resolvida de um outdoor (usada pela API e pelas playlists publicadas)
+def resolve_playlist(outdoor, anuncios_por_id):
+    # Retorna os anúncios na ordem definida em outdoor['anuncios']
+    vinculados_ordenados = []
+    sobrescritas = outdoor.get('anuncios_vinculados') or {}
+    if not isinstance(sobrescritas, dict):
+        sobrescritas = {}
+    for aid in outdoor.get('anuncios') or []:
+        anuncio = anuncios_por_id.get(aid)
+        if anuncio:
+            # Se houver sobrescrita local (válida), aplicar as alterações
+            if isinstance(sobrescritas.get(aid), dict):
+                anuncio_atualizado = anuncio.copy()
+                anuncio_atualizado.update(sobrescritas[aid])
+                vinculados_ordenados.append(anuncio_atualizado)
+            else:
+                vinculados_ordenados.append(anuncio)
+    return vinculados_ordenados
+
 # Listar anúncios vinculados a um outdoor
 @app.route('/api/outdoors/<int:outdoor_id>/anuncios', methods=['GET'])
 def get_anuncios_vinculados(outdoor_id):
     try:
-        outdoors = read_outdoors()
-        anuncios = read_anuncios()
-        outdoor = next((o for o in outdoors if o['id'] == outdoor_id), None)
-        if not outdoor:
+        # No modo de publicação a playlist já está pronta em disco (também comprimida)
+        nome = f'{outdoor_id}.json'
+        if PUBLISH_PLAYLISTS and api_formato() == 'json' and os.path.exists(os.path.join(PLAYLISTS_DIR, nome)):
+            gz = aceita_gzip() and os.path.exists(os.path.join(PLAYLISTS_DIR, nome + '.gz'))
+            response = send_from_directory(PLAYLISTS_DIR, nome + '.gz' if gz else nome,
+                                           mimetype='application/json', conditional=True)
+            if gz:
+                response.headers['Content-Encoding'] = 'gzip'
+            response.headers['Cache-Control'] = 'no-cache'
+            response.vary.add('Accept')
+            response.vary.add('Accept-Encoding')
+            return response
+
+        # Playlist resolvida no aquecimento (refeita quando os JSON mudam)
+        catalogo = load_catalogo()
+        playlist = catalogo['playlists'].get(outdoor_id)
+        if playlist is None:
             return jsonify({'error': 'Outdoor não encontrado'}), 404
         
-        if 'anuncios' not in outdoor or not outdoor['anuncios']:
-            return jsonify([])
-        
-        # Retorna os anúncios na ordem definida em outdoor['anuncios']
-        vinculados_ordenados = []
-        for aid in outdoor['anuncios']:
-            anuncio = next((a for a in anuncios if a['_id'] == aid), None)
-            if anuncio:
-                # Se houver sobrescrita local, aplicar as alterações
-                if 'anuncios_vinculados' in outdoor and aid in outdoor['anuncios_vinculados']:
-                    anuncio_atualizado = anuncio.copy()
-                    anuncio_atualizado.update(outdoor['anuncios_vinculados'][aid])
-                    vinculados_ordenados.append(anuncio_atualizado)
-                else:
-                    vinculados_ordenados.append(anuncio)
-        
-        return jsonify(vinculados_ordenados)
+        return api_response(playlist, catalogo['corpos'], ('playlist', outdoor_id))
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -396,11 +932,16 @@ def patch_anuncio_vinculado(outdoor_id, anuncio_id):
             'duracao': anuncio_global['duracao']
         }
     # Atualiza apenas título e duração
-    if 'titulo' in data:
-        outdoor['anuncios_vinculados'][anuncio_id]['titulo'] = data['titulo']
-    if 'duracao' in data:
-        outdoor['anuncios_vinculados'][anuncio_id]['duracao'] = data['duracao']
+    sobrescrita = dict(outdoor['anuncios_vinculados'][anuncio_id])
+    for campo in ('titulo', 'duracao'):
+        if campo in data:
+            sobrescrita[campo] = data[campo]
+    try:
+        outdoor['anuncios_vinculados'][anuncio_id] = normalize_sobrescrita(sobrescrita)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     save_outdoors(outdoors)
+    publish_playlists([outdoor_id], outdoors=outdoors, anuncios=anuncios)
     return jsonify({'message': 'Anúncio vinculado atualizado com sucesso!', 'anuncio': outdoor['anuncios_vinculados'][anuncio_id]})
 
     outdoors = read_outdoors()
@@ -432,6 +973,7 @@ def desvincular_anuncio(outdoor_id, anuncio_id):
             del outdoor['anuncios_vinculados'][anuncio_id]
         
         save_outdoors(outdoors)
+        publish_playlists([outdoor_id], outdoors=outdoors)
         
         # Notificar players sobre a atualização
         socketio.start_background_task(notify_outdoor_update, outdoor_id)
@@ -457,6 +999,225 @@ def save_anuncios(anuncios):
     with open(ANUNCIOS_FILE, 'w', encoding='utf-8') as f:
         json.dump(anuncios, f, ensure_ascii=False, indent=2)
 
+def migrar_registros():
+    """Normaliza os registros gravados antes do modelo tipado; os inválidos ficam como estão"""
+    for nome, ler, salvar, classe in (('outdoors', read_outdoors, save_outdoors, Outdoor),
+                                      ('anúncios', read_anuncios, save_anuncios, Anuncio)):
+        registros = ler()
+        migrados = []
+        for registro in registros:
+            try:
+                migrados.append(classe.from_dict(registro).to_dict())
+            except (ValueError, KeyError, TypeError, AttributeError) as e:
+                print(f"Registro inválido em {nome} mantido sem alteração "
+                      f"({registro.get('_id', registro.get('id'))}): {e}")
+                migrados.append(registro)
+        if migrados != registros:
+            salvar(migrados)
+
+# ---- PLAYLISTS PUBLICADAS ----
+# Com PUBLISH_PLAYLISTS=1 a playlist resolvida de cada outdoor é gravada em
+# public/playlists/<id>.json (mesmo conteúdo de GET /api/outdoors/<id>/anuncios),
+# para que um proxy ou o serve_static entreguem as leituras dos players sem
+# passar por read_outdoors()/read_anuncios(). A versão de cada arquivo fica em
+# public/playlists/manifest.json.
+import hashlib
+
+PUBLISH_PLAYLISTS = os.environ.get('PUBLISH_PLAYLISTS', '0') == '1'
+PLAYLISTS_DIR = os.path.join(os.path.dirname(__file__), 'public', 'playlists')
+PLAYLISTS_MANIFEST = os.path.join(PLAYLISTS_DIR, 'manifest.json')
+_playlist_versoes = {}
+
+
+def _write_atomic(caminho, conteudo):
+    tmp = f'{caminho}.{os.getpid()}.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(conteudo)
+    os.replace(tmp, caminho)
+
+
+def _save_playlist_manifest():
+    _write_atomic(PLAYLISTS_MANIFEST, json.dumps(_playlist_versoes, sort_keys=True).encode('utf-8'))
+
+
+def outdoors_com_anuncio(outdoors, anuncio_id):
+    return [o['id'] for o in outdoors if anuncio_id in (o.get('anuncios') or [])]
+
+
+def publish_playlists(outdoor_ids=None, outdoors=None, anuncios=None):
+    """Regrava as playlists dos outdoors informados (todos se outdoor_ids for None)"""
+    if not PUBLISH_PLAYLISTS:
+        return
+    if outdoors is None:
+        outdoors = read_outdoors()
+    if anuncios is None:
+        anuncios = read_anuncios()
+    anuncios_por_id = {a['_id']: a for a in anuncios}
+    existentes = {o['id']: o for o in outdoors}
+    alvos = existentes.keys() if outdoor_ids is None else outdoor_ids
+    alterado = False
+    for outdoor_id in alvos:
+        chave = str(outdoor_id)
+        caminho = os.path.join(PLAYLISTS_DIR, f'{outdoor_id}.json')
+        outdoor = existentes.get(outdoor_id)
+        if outdoor is None:
+            # Outdoor excluído: o player passa a receber 404 como na API
+            for arquivo in (caminho, caminho + '.gz'):
+                if os.path.exists(arquivo):
+                    os.remove(arquivo)
+            alterado |= _playlist_versoes.pop(chave, None) is not None
+            continue
+        conteudo = json.dumps(resolve_playlist(outdoor, anuncios_por_id), ensure_ascii=False,
+                              separators=(',', ':')).encode('utf-8')
+        versao = hashlib.sha1(conteudo).hexdigest()[:12]
+        if _playlist_versoes.get(chave) == versao and os.path.exists(caminho):
+            continue
+        _write_atomic(caminho, conteudo)
+        # Versão comprimida ao lado, para o proxy (gzip_static) e para o get_anuncios_vinculados
+        if len(conteudo) >= API_GZIP_MIN_BYTES:
+            _write_atomic(caminho + '.gz', gzip.compress(conteudo, compresslevel=9, mtime=0))
+        elif os.path.exists(caminho + '.gz'):
+            os.remove(caminho + '.gz')
+        _playlist_versoes[chave] = versao
+        alterado = True
+    if alterado:
+        _save_playlist_manifest()
+
+
+if PUBLISH_PLAYLISTS:
+    os.makedirs(PLAYLISTS_DIR, exist_ok=True)
+    if os.path.exists(PLAYLISTS_MANIFEST):
+        with open(PLAYLISTS_MANIFEST, 'r', encoding='utf-8') as f:
+            _playlist_versoes.update(json.load(f))
+
+# ---- VARIANTES DE IMAGEM ----
+# Para anúncios de imagem são geradas cópias redimensionadas e recomprimidas por
+# perfil de exibição (tipo do outdoor), gravadas em uploads/variantes. O serve_upload
+# escolhe a variante pelo parâmetro ?outdoor=<id> (ou ?perfil=) e pelo Accept.
+# Pillow é opcional: sem ele as imagens continuam sendo servidas no tamanho original.
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+from eventlet import GreenPool, tpool
+
+VARIANTES_FOLDER = os.path.join(UPLOAD_FOLDER, 'variantes')
+os.makedirs(VARIANTES_FOLDER, exist_ok=True)
+# Resolução máxima e qualidade de compressão por tipo de outdoor
+DISPLAY_PROFILES = {
+    'LED': {'largura': 1920, 'altura': 1080, 'qualidade': 80},
+    'LCD': {'largura': 1280, 'altura': 720, 'qualidade': 82},
+    'projetor': {'largura': 1920, 'altura': 1080, 'qualidade': 85},
+}
+IMAGEM_EXTENSOES = ('png', 'jpg', 'jpeg', 'gif')
+VARIANTE_EXTENSOES = {'jpeg': 'jpg', 'png': 'png', 'webp': 'webp'}
+# Marca as variantes descartadas por não ficarem menores que o original, para não recodificar a cada boot
+VARIANTE_DESCARTADA = '.descartada'
+VARIANTE_CACHE_CURTO = 300  # segundos de cache para imagens escolhidas por ?outdoor= ou sem variante pronta
+# Gerações simultâneas; o trabalho de CPU roda no pool de threads do eventlet
+_variantes_pool = GreenPool(int(os.environ.get('VARIANTES_WORKERS', '2')))
+_variantes_em_andamento = set()
+
+
+def nome_variante(arquivo, perfil, formato):
+    cfg = DISPLAY_PROFILES[perfil]
+    # Os parâmetros do perfil fazem parte do nome: mudar a configuração gera novas variantes
+    return f"{arquivo}.{perfil}-{cfg['largura']}x{cfg['altura']}q{cfg['qualidade']}.{VARIANTE_EXTENSOES[formato]}"
+
+
+def gerar_variantes(arquivo):
+    """Gera (ou reaproveita do disco) as variantes de uma imagem; retorna {perfil: {formato: caminho}}"""
+    origem = os.path.join(UPLOAD_FOLDER, arquivo)
+    with Image.open(origem) as original:
+        if getattr(original, 'is_animated', False):
+            return {}  # GIF animado é servido como está
+        imagem = ImageOps.exif_transpose(original)
+        imagem.load()
+    transparente = imagem.mode in ('RGBA', 'LA') or 'transparency' in imagem.info
+    formatos = ('png' if transparente else 'jpeg', 'webp')
+    tamanho_original = os.path.getsize(origem)
+    variantes = {}
+    for perfil, cfg in DISPLAY_PROFILES.items():
+        for formato in formatos:
+            nome = nome_variante(arquivo, perfil, formato)
+            destino = os.path.join(VARIANTES_FOLDER, nome)
+            marcador = destino + VARIANTE_DESCARTADA
+            if os.path.exists(marcador) and os.path.getmtime(marcador) >= os.path.getmtime(origem):
+                continue
+            if not (os.path.exists(destino) and os.path.getmtime(destino) >= os.path.getmtime(origem)):
+                copia = imagem.copy()
+                copia.thumbnail((cfg['largura'], cfg['altura']), Image.LANCZOS)
+                if formato == 'jpeg' and copia.mode not in ('RGB', 'L'):
+                    copia = copia.convert('RGB')
+                tmp = f'{destino}.{uuid.uuid4().hex}.tmp'
+                copia.save(tmp, format=formato.upper(), quality=cfg['qualidade'], optimize=True)
+                os.replace(tmp, destino)
+            # Variante que não ficou menor que o original não vale a pena
+            if os.path.getsize(destino) >= tamanho_original:
+                open(marcador, 'w').close()
+                os.remove(destino)
+                continue
+            variantes.setdefault(perfil, {})[formato] = 'variantes/' + nome
+    return variantes
+
+
+def _gerar_variantes_anuncio(anuncio_id, arquivo):
+    try:
+        variantes = tpool.execute(gerar_variantes, arquivo)
+    except Exception as e:
+        print(f'Erro ao gerar variantes de {arquivo}: {e}')
+        return
+    finally:
+        _variantes_em_andamento.discard(arquivo)
+    anuncios = read_anuncios()
+    anuncio = next((a for a in anuncios if a['_id'] == anuncio_id), None)
+    esquecer_midias(arquivo)
+    if not anuncio or anuncio.get('arquivo') != arquivo or anuncio.get('variantes') == variantes:
+        return
+    anuncio['variantes'] = variantes
+    save_anuncios(anuncios)
+    outdoors = read_outdoors() if PUBLISH_PLAYLISTS else []
+    publish_playlists(outdoors_com_anuncio(outdoors, anuncio_id), outdoors=outdoors, anuncios=anuncios)
+
+
+def agendar_variantes(anuncio):
+    """Agenda a geração de variantes em segundo plano para anúncios de imagem"""
+    arquivo = anuncio.get('arquivo')
+    if Image is None or anuncio.get('tipo') != TipoAnuncio.IMAGEM.value or not arquivo:
+        return
+    if arquivo.rsplit('.', 1)[-1].lower() not in IMAGEM_EXTENSOES or arquivo in _variantes_em_andamento:
+        return
+    _variantes_em_andamento.add(arquivo)
+    _variantes_pool.spawn_n(_gerar_variantes_anuncio, anuncio['_id'], arquivo)
+
+
+def remover_variantes(arquivo):
+    esquecer_midias(arquivo)
+    for nome in os.listdir(VARIANTES_FOLDER):
+        if nome.startswith(arquivo + '.'):
+            os.remove(os.path.join(VARIANTES_FOLDER, nome))
+
+
+def escolher_variante(filename):
+    """Caminho da melhor variante para a requisição atual, ou None para servir o original"""
+    perfil = request.args.get('perfil')
+    outdoor_id = request.args.get('outdoor')
+    if not perfil and outdoor_id and outdoor_id.isdigit() and len(outdoor_id) <= 18:
+        outdoor = load_catalogo()['outdoors'].get(int(outdoor_id))
+        perfil = outdoor and getattr(outdoor.tipo, 'value', outdoor.tipo)
+    if perfil not in DISPLAY_PROFILES:
+        return None
+    formatos = ['jpeg', 'png']
+    # WebP só quando listado explicitamente (com q > 0): TVs antigas mandam */* sem suportá-lo
+    if any(mimetype == 'image/webp' and q > 0 for mimetype, q in request.accept_mimetypes):
+        formatos.insert(0, 'webp')
+    for formato in formatos:
+        nome = nome_variante(filename, perfil, formato)
+        if os.path.isfile(os.path.join(VARIANTES_FOLDER, nome)):
+            return 'variantes/' + nome
+    return None
+
+
 # Rota para criar anúncio com upload
 @app.route('/api/anuncios', methods=['POST'])
 def create_anuncio():
@@ -483,32 +1244,30 @@ def create_anuncio():
         if not user:
             return jsonify({'error': 'Usuário não encontrado'}), 404
             
-        titulo = data.get('titulo')
-        tipo = data.get('tipo')
-        duracao = data.get('duracao')
-        arquivo = None
-        
-        if 'arquivo' in request.files:
-            arquivo_obj = request.files['arquivo']
-            # Gera nome seguro e único
-            filename = f"{uuid.uuid4()}_{secure_filename(arquivo_obj.filename)}"
-            caminho = os.path.join(UPLOAD_FOLDER, filename)
-            arquivo_obj.save(caminho)
-            arquivo = filename
-            
-        anuncio = {
-            '_id': str(uuid.uuid4()),
-            'titulo': titulo,
-            'tipo': tipo,
-            'duracao': duracao,
-            'arquivo': arquivo,
-            'usuario': user_email,  # Usando o email do token JWT
-            'data_criacao': datetime.now().isoformat()
-        }
+        arquivo_obj = request.files.get('arquivo')
+        # Gera nome seguro e único
+        arquivo = f"{uuid.uuid4()}_{secure_filename(arquivo_obj.filename)}" if arquivo_obj else None
+        
+        try:
+            anuncio = Anuncio.from_dict({
+                '_id': str(uuid.uuid4()),
+                'titulo': data.get('titulo'),
+                'tipo': data.get('tipo'),
+                'duracao': data.get('duracao'),
+                'arquivo': arquivo,
+                'usuario': user_email,  # Usando o email do token JWT
+                'data_criacao': datetime.now().isoformat()
+            }).to_dict()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        if arquivo_obj:
+            arquivo_obj.save(os.path.join(UPLOAD_FOLDER, arquivo))
         
         anuncios = read_anuncios()
         anuncios.append(anuncio)
         save_anuncios(anuncios)
+        agendar_variantes(anuncio)
         
         return jsonify({'message': 'Anúncio criado com sucesso!', 'anuncio': anuncio}), 201
         
@@ -531,10 +1290,9 @@ def get_anuncios_meus():
         user_email = decoded['email']
         
         # Filtrar anúncios pelo email do usuário
-        anuncios = read_anuncios()
-        anuncios_usuario = [a for a in anuncios if a.get('usuario') == user_email]
-        
-        return jsonify(anuncios_usuario)
+        catalogo = load_catalogo()
+        return api_response(lambda: [a.to_dict() for a in catalogo['anuncios'].values() if a.usuario == user_email],
+                            catalogo['corpos'], ('anuncios', user_email))
     except jwt.ExpiredSignatureError:
         return jsonify({'error': 'Token expirado'}), 401
     except jwt.InvalidTokenError:
@@ -564,22 +1322,30 @@ def patch_anuncio(id):
         if anuncios[anuncio_index].get('usuario') != user_email:
             return jsonify({'error': 'Você não tem permissão para editar este anúncio'}), 403
             
-        # Obter outdoor_id antes de atualizar
-        outdoor_id = anuncios[anuncio_index].get('outdoor_id')
-        
-        # Atualizar apenas os campos fornecidos
+        # Atualizar apenas os campos editáveis fornecidos
         data = request.get_json()
-        for key, value in data.items():
-            if key != '_id' and key != 'id':  # Não permitir alterar o ID
-                anuncios[anuncio_index][key] = value
+        invalidos = [k for k in data if k not in Anuncio.EDITAVEIS and k not in ('_id', 'id')]
+        if invalidos:
+            return jsonify({'error': f'Campos não editáveis: {", ".join(invalidos)}'}), 400
+        atualizado = dict(anuncios[anuncio_index])
+        for key in Anuncio.EDITAVEIS:
+            if key in data:
+                atualizado[key] = data[key]
         
         # Atualizar data de modificação
-        anuncios[anuncio_index]['ultima_atualizacao'] = datetime.now().isoformat()
+        atualizado['ultima_atualizacao'] = datetime.now().isoformat()
+        try:
+            anuncios[anuncio_index] = Anuncio.from_dict(atualizado).to_dict()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
                 
         save_anuncios(anuncios)
+        outdoors = read_outdoors()
+        outdoor_ids = outdoors_com_anuncio(outdoors, id)
+        publish_playlists(outdoor_ids, outdoors=outdoors, anuncios=anuncios)
         
-        # Notificar atualização do anúncio
-        if outdoor_id:
+        # Notificar atualização do anúncio nos outdoors onde ele está vinculado
+        for outdoor_id in outdoor_ids:
             notify_anuncio_update(outdoor_id, id)
         
         return jsonify(anuncios[anuncio_index])
@@ -617,18 +1383,21 @@ def delete_anuncio(id):
     if anuncio.get('usuario') != user_email:
         return jsonify({'error': 'Você não tem permissão para excluir este anúncio'}), 403
     
-    # Excluir arquivo do disco, se existir
+    # Remove do json
+    anuncios = [a for a in anuncios if a['_id'] != id]
+    save_anuncios(anuncios)
+    
+    # Excluir arquivo do disco, se existir (só depois de o registro ter sido removido)
     if anuncio.get('arquivo'):
         caminho = os.path.join(UPLOAD_FOLDER, anuncio['arquivo'])
         if os.path.exists(caminho):
             try:
                 os.remove(caminho)
+                remover_variantes(anuncio['arquivo'])
             except Exception as e:
                 print(f'Erro ao excluir arquivo: {e}')
-    
-    # Remove do json
-    anuncios = [a for a in anuncios if a['_id'] != id]
-    save_anuncios(anuncios)
+    outdoors = read_outdoors() if PUBLISH_PLAYLISTS else []
+    publish_playlists(outdoors_com_anuncio(outdoors, id), outdoors=outdoors, anuncios=anuncios)
     return jsonify({'message': 'Anúncio excluído com sucesso!'})
 
 @app.route('/api/outdoors/<int:outdoor_id>/anuncios/ordem', methods=['PATCH'])
@@ -651,6 +1420,7 @@ def atualizar_ordem_anuncios(outdoor_id):
         # Atualizar a ordem dos anúncios
         outdoor['anuncios'] = data['anuncios']
         save_outdoors(outdoors)
+        publish_playlists([outdoor_id], outdoors=outdoors)
         
         # Notificar os players sobre a mudança
         socketio.start_background_task(notify_outdoor_update, outdoor_id)
@@ -683,6 +1453,7 @@ def atualizar_ordem_anuncios_put(outdoor_id):
         # Atualizar a ordem dos anúncios
         outdoor['anuncios'] = nova_ordem
         save_outdoors(outdoors)
+        publish_playlists([outdoor_id], outdoors=outdoors)
         
         # Notificar os players sobre a mudança
         socketio.start_background_task(notify_outdoor_update, outdoor_id)
@@ -697,36 +1468,545 @@ def atualizar_ordem_anuncios_put(outdoor_id):
 @socketio.on('connect')
 def handle_connect():
     print('Cliente conectado')
+    if reconexao_em_massa():
+        # O aviso sai depois do handshake, quando o cliente já pode recebê-lo
+        socketio.start_background_task(notify_backoff, request.sid)
 
 @socketio.on('disconnect')
 def handle_disconnect():
+    esquecer_conexao(request.sid)
     print('Cliente desconectado')
 
 @socketio.on('join_outdoor')
 def handle_join_outdoor(data):
     """Adiciona o cliente à sala do outdoor para receber atualizações"""
+    espera = socket_rate_limited('join_outdoor')
+    if espera:
+        return resposta_limite_socket(espera)
     outdoor_id = data.get('outdoor_id')
     if outdoor_id:
         from flask_socketio import join_room
         join_room(outdoor_id)
         print(f'Cliente entrou na sala do outdoor {outdoor_id}')
+        return {'ok': True}
+
+# Função para pedir a um player que espalhe no tempo as próximas reconexões e recargas
+def notify_backoff(sid, servidor=None):
+    (servidor or socketio).emit('backoff', {
+        'atraso': random.randint(RECONEXAO_ATRASO_MIN, RECONEXAO_ATRASO_MAX),
+        'atraso_min': RECONEXAO_ATRASO_MIN,
+        'atraso_max': RECONEXAO_ATRASO_MAX
+    }, to=sid)
 
 # Função para notificar players sobre mudanças em um outdoor
 def notify_outdoor_update(outdoor_id):
     """Notifica todos os players conectados ao outdoor sobre uma atualização"""
     print(f"Notificando atualização do outdoor {outdoor_id}")
-    socketio.emit('outdoor_updated', {'outdoor_id': str(outdoor_id)}, room=str(outdoor_id))
+    emit_players('outdoor_updated', {'outdoor_id': str(outdoor_id)}, room=str(outdoor_id))
 
 # Função para notificar players sobre atualização de um anúncio
 def notify_anuncio_update(outdoor_id, anuncio_id):
     """Notifica sobre a atualização de um anúncio específico"""
     print(f"Notificando atualização do anúncio {anuncio_id} no outdoor {outdoor_id}")
-    socketio.emit('anuncio_updated', {
+    emit_players('anuncio_updated', {
         'outdoor_id': str(outdoor_id),
         'anuncio_id': str(anuncio_id)
     }, room=str(outdoor_id))
 
 
+# ---- PROOF OF PLAY ----
+import atexit
+from datetime import timezone
+
+PLAY_EVENTS_DIR = os.environ.get('PLAY_EVENTS_DIR', os.path.join(os.path.dirname(__file__), 'play_events'))
+PLAY_ROLLUPS_FILE = os.path.join(PLAY_EVENTS_DIR, 'rollups.json')
+PLAY_BUFFER_CAPACITY = int(os.environ.get('PLAY_BUFFER_CAPACITY', '50000'))  # eventos em memória
+PLAY_BATCH_MAX = 1000  # eventos por lote recebido
+PLAY_FLUSH_INTERVAL = float(os.environ.get('PLAY_FLUSH_INTERVAL', '1'))  # segundos
+PLAY_SEGMENT_MAX_BYTES = int(os.environ.get('PLAY_SEGMENT_MAX_BYTES', str(16 * 1024 * 1024)))
+PLAY_SEGMENT_MAX_AGE = int(os.environ.get('PLAY_SEGMENT_MAX_AGE', '3600'))  # segundos
+PLAY_SNAPSHOT_INTERVAL = 10  # segundos entre gravações do rollups.json
+PLAY_RETRY_AFTER = 2  # segundos sugeridos ao cliente quando o buffer está cheio
+PLAY_INICIO_PASSADO = timedelta(days=366)  # exibições mais antigas que isso são descartadas
+PLAY_INICIO_FUTURO = timedelta(days=1)  # tolerância para relógios adiantados nas TVs
+PLAY_OUTDOOR_ID_MAX = 18  # dígitos
+os.makedirs(PLAY_EVENTS_DIR, exist_ok=True)
+
+
+class PlayEventBuffer:
+    """Buffer circular de tamanho fixo entre a ingestão e os segmentos em disco"""
+
+    def __init__(self, capacity):
+        self._slots = [None] * capacity
+        self._capacity = capacity
+        self._head = 0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._count
+
+    def offer(self, eventos):
+        """Enfileira o lote inteiro ou nada. Retorna False quando não há espaço (backpressure)"""
+        with self._lock:
+            n = len(eventos)
+            if self._count + n > self._capacity:
+                return False
+            tail = (self._head + self._count) % self._capacity
+            first = min(n, self._capacity - tail)
+            self._slots[tail:tail + first] = eventos[:first]
+            self._slots[:n - first] = eventos[first:]
+            self._count += n
+            return True
+
+    def drain(self, limit):
+        """Remove e retorna até `limit` eventos na ordem de chegada"""
+        with self._lock:
+            n = min(limit, self._count)
+            head = self._head
+            first = min(n, self._capacity - head)
+            eventos = self._slots[head:head + first] + self._slots[:n - first]
+            self._slots[head:head + first] = [None] * first
+            self._slots[:n - first] = [None] * (n - first)
+            self._head = (head + n) % self._capacity
+            self._count -= n
+            return eventos
+
+
+class PlaySegmentStore:
+    """Segmentos append-only (um JSON por linha) com rotação por tamanho e por idade"""
+
+    def __init__(self, directory, max_bytes, max_age):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._file = None
+        self._name = None
+        self._opened_at = 0
+
+    def segments(self):
+        return sorted(n for n in os.listdir(self.directory) if n.startswith('plays-') and n.endswith('.jsonl'))
+
+    def _open(self):
+        # O nome carrega o instante de abertura, então a ordem alfabética é a ordem de escrita
+        name = f'plays-{int(time.time() * 1000):013d}.jsonl'
+        while os.path.exists(os.path.join(self.directory, name)):
+            name = f'plays-{int(name[6:19]) + 1:013d}.jsonl'
+        self._file = open(os.path.join(self.directory, name), 'ab')
+        self._name = name
+        self._opened_at = time.monotonic()
+
+    def close(self):
+        if self._file:
+            self._file.close()
+        self._file = None
+        self._name = None
+
+    def append(self, linhas):
+        """Grava as linhas no segmento atual e retorna (segmento, offset final)"""
+        if self._file and (self._file.tell() >= self.max_bytes
+                           or time.monotonic() - self._opened_at >= self.max_age):
+            self.close()
+        if not self._file:
+            self._open()
+        self._file.write(''.join(linhas).encode('utf-8'))
+        self._file.flush()
+        return self._name, self._file.tell()
+
+
+class PlayRollups:
+    """Totais pré-calculados de exibições e tempo no ar por (anúncio, outdoor, dia)"""
+
+    AGRUPAMENTOS = ('anuncio', 'outdoor', 'dia')
+
+    def __init__(self):
+        self._totais = {}
+        self._lock = threading.Lock()
+
+    def apply(self, eventos):
+        with self._lock:
+            for evento in eventos:
+                chave = (evento['anuncio_id'], evento['outdoor_id'], evento['inicio'][:10])
+                total = self._totais.get(chave)
+                if total is None:
+                    total = self._totais[chave] = [0, 0, 0.0]
+                total[0] += 1
+                total[1] += 1 if evento['completo'] else 0
+                total[2] += evento['duracao']
+
+    def query(self, agrupar, anuncio_ids=None, outdoor_id=None, de=None, ate=None):
+        indices = [self.AGRUPAMENTOS.index(campo) for campo in agrupar]
+        resultado = {}
+        with self._lock:
+            for chave, (plays, completos, tempo) in self._totais.items():
+                if anuncio_ids is not None and chave[0] not in anuncio_ids:
+                    continue
+                if outdoor_id is not None and chave[1] != outdoor_id:
+                    continue
+                if (de and chave[2] < de) or (ate and chave[2] > ate):
+                    continue
+                grupo = tuple(chave[i] for i in indices)
+                total = resultado.get(grupo)
+                if total is None:
+                    total = resultado[grupo] = [0, 0, 0.0]
+                total[0] += plays
+                total[1] += completos
+                total[2] += tempo
+        linhas = []
+        for grupo in sorted(resultado):
+            plays, completos, tempo = resultado[grupo]
+            linha = {campo: grupo[i] for i, campo in enumerate(agrupar)}
+            linha.update({'plays': plays, 'completos': completos, 'tempo_exibicao': round(tempo, 3)})
+            linhas.append(linha)
+        return linhas
+
+    def dump(self):
+        with self._lock:
+            return [list(chave) + total for chave, total in self._totais.items()]
+
+    def load(self, linhas):
+        with self._lock:
+            self._totais = {tuple(linha[:3]): list(linha[3:]) for linha in linhas}
+
+
+play_buffer = PlayEventBuffer(PLAY_BUFFER_CAPACITY)
+play_store = PlaySegmentStore(PLAY_EVENTS_DIR, PLAY_SEGMENT_MAX_BYTES, PLAY_SEGMENT_MAX_AGE)
+play_rollups = PlayRollups()
+_play_flush_lock = threading.Lock()
+_play_state = {'flusher': False, 'segmento': None, 'offset': 0, 'snapshot_em': 0}
+
+
+def _parse_play_inicio(valor):
+    """Aceita epoch em milissegundos ou ISO 8601 e devolve ISO em UTC; None se inválido ou fora da janela"""
+    if isinstance(valor, bool):
+        return None
+    try:
+        if isinstance(valor, (int, float)):
+            inicio = datetime.fromtimestamp(valor / 1000, tz=timezone.utc)
+        elif isinstance(valor, str) and len(valor) <= 40:
+            inicio = datetime.fromisoformat(valor[:-1] + '+00:00' if valor.endswith('Z') else valor)
+            if inicio.tzinfo is None:
+                inicio = inicio.replace(tzinfo=timezone.utc)
+            inicio = inicio.astimezone(timezone.utc)
+        else:
+            return None
+    except (ValueError, OverflowError, OSError):
+        return None
+    agora = datetime.now(timezone.utc)
+    if not agora - PLAY_INICIO_PASSADO <= inicio <= agora + PLAY_INICIO_FUTURO:
+        return None
+    return inicio.replace(tzinfo=None).isoformat(timespec='milliseconds')
+
+
+def normalize_play_event(data):
+    """Valida um registro de exibição vindo do player; retorna None se for inválido"""
+    if not isinstance(data, dict):
+        return None
+    anuncio_id = data.get('anuncio_id')
+    outdoor_id = data.get('outdoor_id')
+    if not isinstance(anuncio_id, str) or not anuncio_id or len(anuncio_id) > 64:
+        return None
+    if isinstance(outdoor_id, int) and not isinstance(outdoor_id, bool):
+        if not 0 <= outdoor_id < 10 ** PLAY_OUTDOOR_ID_MAX:
+            return None
+    elif not isinstance(outdoor_id, str) or not outdoor_id.isdigit() or len(outdoor_id) > PLAY_OUTDOOR_ID_MAX:
+        return None
+    try:
+        duracao = float(data.get('duracao'))
+    except (TypeError, ValueError):
+        return None
+    if not 0 <= duracao <= 86400:
+        return None
+    inicio = _parse_play_inicio(data.get('inicio'))
+    if inicio is None:
+        return None
+    return {
+        'anuncio_id': anuncio_id,
+        'outdoor_id': str(int(outdoor_id)),
+        'inicio': inicio,
+        'duracao': duracao,
+        'completo': bool(data.get('completo'))
+    }
+
+
+def ingest_play_events(eventos):
+    """Valida e enfileira um lote. Retorna (aceitos, rejeitados) ou None se o buffer estiver cheio"""
+    # Só entram exibições de anúncios cadastrados e vinculados ao outdoor informado,
+    # para que ids inventados não criem novas chaves nos totais
+    catalogo = load_catalogo()
+    validos = []
+    for evento in map(normalize_play_event, eventos):
+        if evento is None or evento['anuncio_id'] not in catalogo['anuncios']:
+            continue
+        outdoor = catalogo['outdoors'].get(int(evento['outdoor_id']))
+        if outdoor is None or evento['anuncio_id'] not in outdoor.anuncios:
+            continue
+        validos.append(evento)
+    if validos and not play_buffer.offer(validos):
+        return None
+    _ensure_play_flusher()
+    return len(validos), len(eventos) - len(validos)
+
+
+def save_play_rollups():
+    snapshot = {
+        'segmento': _play_state['segmento'],
+        'offset': _play_state['offset'],
+        'totais': play_rollups.dump()
+    }
+    tmp = PLAY_ROLLUPS_FILE + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(snapshot, f, ensure_ascii=False, separators=(',', ':'))
+    os.replace(tmp, PLAY_ROLLUPS_FILE)
+    _play_state['snapshot_em'] = time.monotonic()
+
+
+def load_play_rollups():
+    """Carrega o último rollups.json e reaplica o que foi gravado nos segmentos depois dele"""
+    segmento, offset = None, 0
+    if os.path.exists(PLAY_ROLLUPS_FILE):
+        with open(PLAY_ROLLUPS_FILE, 'r', encoding='utf-8') as f:
+            snapshot = json.load(f)
+        play_rollups.load(snapshot.get('totais', []))
+        segmento, offset = snapshot.get('segmento'), snapshot.get('offset', 0)
+    for nome in play_store.segments():
+        if segmento and nome < segmento:
+            continue
+        with open(os.path.join(PLAY_EVENTS_DIR, nome), 'rb') as f:
+            offset = offset if nome == segmento else 0
+            f.seek(offset)
+            eventos = []
+            for linha in f:
+                try:
+                    eventos.append(json.loads(linha))
+                except ValueError:
+                    break  # linha incompleta de uma gravação interrompida
+                offset += len(linha)
+            play_rollups.apply(eventos)
+        segmento = nome
+    _play_state['segmento'], _play_state['offset'] = segmento, offset
+
+
+def flush_play_events():
+    """Move o conteúdo do buffer para o segmento atual e atualiza os rollups"""
+    with _play_flush_lock:
+        total = 0
+        while len(play_buffer):
+            eventos = play_buffer.drain(PLAY_BUFFER_CAPACITY)
+            linhas = [json.dumps(e, ensure_ascii=False, separators=(',', ':')) + '\n' for e in eventos]
+            _play_state['segmento'], _play_state['offset'] = play_store.append(linhas)
+            play_rollups.apply(eventos)
+            total += len(eventos)
+        if total and time.monotonic() - _play_state['snapshot_em'] >= PLAY_SNAPSHOT_INTERVAL:
+            save_play_rollups()
+        return total
+
+
+def _play_flush_loop():
+    while True:
+        socketio.sleep(PLAY_FLUSH_INTERVAL)
+        try:
+            flush_play_events()
+        except Exception as e:
+            print(f'Erro ao gravar eventos de exibição: {e}')
+
+
+def _ensure_play_flusher():
+    if not _play_state['flusher']:
+        _play_state['flusher'] = True
+        socketio.start_background_task(_play_flush_loop)
+
+
+def _shutdown_play_events():
+    flush_play_events()
+    save_play_rollups()
+    play_store.close()
+
+
+load_play_rollups()
+atexit.register(_shutdown_play_events)
+
+
+@app.route('/api/plays', methods=['POST'])
+def receber_play_events():
+    data = request.get_json(silent=True)
+    eventos = data.get('eventos') if isinstance(data, dict) else data
+    if not isinstance(eventos, list):
+        return jsonify({'error': 'Lista de eventos inválida'}), 400
+    if len(eventos) > PLAY_BATCH_MAX:
+        return jsonify({'error': f'Máximo de {PLAY_BATCH_MAX} eventos por lote'}), 413
+    resultado = ingest_play_events(eventos)
+    if resultado is None:
+        response = jsonify({'error': 'Servidor ocupado, tente novamente', 'retry_after': PLAY_RETRY_AFTER})
+        response.headers['Retry-After'] = str(PLAY_RETRY_AFTER)
+        return response, 503
+    return jsonify({'aceitos': resultado[0], 'rejeitados': resultado[1]}), 202
+
+
+def processar_play_events(data, sid):
+    """Recebe lotes de exibições do player; o retorno é enviado como ack ao cliente"""
+    eventos = data.get('eventos') if isinstance(data, dict) else data
+    if not isinstance(eventos, list) or len(eventos) > PLAY_BATCH_MAX:
+        return {'error': 'Lista de eventos inválida'}
+    espera = socket_rate_limited('play_events', sid)
+    if espera:
+        return resposta_limite_socket(espera)
+    resultado = ingest_play_events(eventos)
+    if resultado is None:
+        return {'error': 'Servidor ocupado, tente novamente', 'retry_after': PLAY_RETRY_AFTER}
+    return {'aceitos': resultado[0], 'rejeitados': resultado[1]}
+
+
+@socketio.on('play_events')
+def handle_play_events(data):
+    return processar_play_events(data, request.sid)
+
+
+@app.route('/api/plays/resumo', methods=['GET'])
+def resumo_plays():
+    """Exibições e tempo no ar dos anúncios do usuário, agrupados por anúncio, outdoor e/ou dia (YYYY-MM-DD)"""
+    auth_header = request.headers.get('Authorization')
+    if not auth_header or not auth_header.startswith('Bearer '):
+        return jsonify({'error': 'Token de autenticação não fornecido'}), 401
+    
+    token = auth_header.split(' ')[1]
+    
+    try:
+        decoded = jwt.decode(token, app.config['SECRET_KEY'], algorithms=['HS256'])
+        user_email = decoded['email']
+    except jwt.ExpiredSignatureError:
+        return jsonify({'error': 'Token expirado'}), 401
+    except jwt.InvalidTokenError:
+        return jsonify({'error': 'Token inválido'}), 401
+    
+    agrupar = [c for c in request.args.get('agrupar', 'anuncio,outdoor,dia').split(',') if c]
+    if not agrupar or any(c not in PlayRollups.AGRUPAMENTOS for c in agrupar):
+        return jsonify({'error': 'agrupar deve combinar anuncio, outdoor e dia'}), 400
+    
+    # Só entram anúncios do usuário
+    meus = {aid for aid, a in load_catalogo()['anuncios'].items() if a.usuario == user_email}
+    anuncio_id = request.args.get('anuncio_id')
+    if anuncio_id is not None:
+        meus &= {anuncio_id}
+    outdoor_id = request.args.get('outdoor_id')
+    return jsonify(play_rollups.query(
+        agrupar,
+        anuncio_ids=meus,
+        outdoor_id=str(int(outdoor_id)) if outdoor_id and outdoor_id.isdigit() else outdoor_id,
+        de=request.args.get('de'),
+        ate=request.args.get('ate')
+    ))
+
+
+# ---- WARM START ----
+# Antes de aceitar tráfego o worker carrega e indexa outdoors e anúncios, lê os
+# metadados das mídias (ETags) e resolve a playlist de cada outdoor. Assim, depois
+# de um deploy ou da reciclagem por max_requests, a primeira onda de TVs já
+# encontra tudo em memória. /healthz indica que o processo está vivo e /readyz
+# que o aquecimento terminou; se ele falhar, o /readyz tenta de novo.
+_catalogo = {'versao': None, 'outdoors': {}, 'anuncios': {}, 'playlists': {}, 'corpos': {}}
+_midias = {}  # caminho relativo em uploads -> ETag
+_warm_state = {'pronto': False, 'erro': None, 'duracao': None, 'tentativa': 0.0}
+WARM_RETRY_INTERVAL = 5  # segundos mínimos entre novas tentativas de aquecimento
+
+
+def _versao_catalogo():
+    versao = []
+    for caminho in (OUTDOORS_FILE, ANUNCIOS_FILE):
+        try:
+            st = os.stat(caminho)
+            versao.append((st.st_mtime_ns, st.st_size))
+        except FileNotFoundError:
+            versao.append(None)
+    return tuple(versao)
+
+
+def load_catalogo():
+    """Registros Outdoor/Anuncio indexados por id e playlists resolvidas; refeito quando os JSON mudam"""
+    versao = _versao_catalogo()
+    if _catalogo['versao'] != versao:
+        outdoors = read_outdoors()
+        anuncios_por_id = {a['_id']: a for a in read_anuncios()}
+        _catalogo.update(
+            versao=versao,
+            outdoors={o['id']: Outdoor.carregar(o) for o in outdoors},
+            anuncios={aid: Anuncio.carregar(a) for aid, a in anuncios_por_id.items()},
+            playlists={o['id']: resolve_playlist(o, anuncios_por_id) for o in outdoors},
+            corpos={}  # respostas já codificadas (JSON/msgpack, com ou sem gzip)
+        )
+    return _catalogo
+
+
+def media_etag(nome):
+    """ETag de um arquivo em uploads, calculado uma vez a partir do tamanho e da data de modificação"""
+    etag = _midias.get(nome)
+    if etag is None:
+        st = os.stat(os.path.join(UPLOAD_FOLDER, nome))
+        etag = _midias[nome] = hashlib.sha1(f'{nome}:{st.st_size}:{st.st_mtime_ns}'.encode('utf-8')).hexdigest()[:20]
+    return etag
+
+
+def esquecer_midias(arquivo):
+    for nome in [n for n in _midias if n == arquivo or n.startswith(f'variantes/{arquivo}.')]:
+        del _midias[nome]
+
+
+def index_midias():
+    for pasta, prefixo in ((UPLOAD_FOLDER, ''), (VARIANTES_FOLDER, 'variantes/')):
+        for nome in os.listdir(pasta):
+            if os.path.isfile(os.path.join(pasta, nome)) and not nome.endswith(('.tmp', VARIANTE_DESCARTADA)):
+                media_etag(prefixo + nome)
+
+
+def warm_start():
+    inicio = _warm_state['tentativa'] = time.monotonic()
+    try:
+        migrar_registros()
+        catalogo = load_catalogo()
+        index_midias()
+        publish_playlists()
+        # Completa as variantes de imagens já cadastradas (as que estão em disco são reaproveitadas)
+        for anuncio in read_anuncios():
+            agendar_variantes(anuncio)
+    except Exception as e:
+        _warm_state['erro'] = str(e)
+        print(f'Erro no aquecimento: {e}')
+        return
+    _warm_state['duracao'] = round(time.monotonic() - inicio, 3)
+    _warm_state['erro'] = None
+    _warm_state['pronto'] = True
+    print(f"Aquecimento concluído em {_warm_state['duracao']}s: {len(catalogo['outdoors'])} outdoors, "
+          f"{len(catalogo['anuncios'])} anúncios, {len(_midias)} mídias")
+
+
+@app.route('/healthz')
+def healthz():
+    return jsonify({'status': 'ok'})
+
+
+@app.route('/readyz')
+def readyz():
+    # Falha transitória no boot (ex.: JSON sendo gravado): tenta aquecer de novo
+    if not _warm_state['pronto'] and time.monotonic() - _warm_state['tentativa'] >= WARM_RETRY_INTERVAL:
+        warm_start()
+    if not _warm_state['pronto']:
+        return jsonify({'status': 'erro' if _warm_state['erro'] else 'aquecendo', 'erro': _warm_state['erro']}), 503
+    try:
+        catalogo = load_catalogo()
+    except Exception as e:
+        return jsonify({'status': 'erro', 'erro': str(e)}), 503
+    return jsonify({
+        'status': 'ok',
+        'outdoors': len(catalogo['outdoors']),
+        'anuncios': len(catalogo['anuncios']),
+        'midias': len(_midias),
+        'tempo_aquecimento': _warm_state['duracao']
+    })
+
+
+warm_start()
+
+
 
 if __name__ == '__main__':
     @app.route('/api/outdoor/<outdoor_id>/player/reload', methods=['POST'])
@@ -734,12 +2014,12 @@ if __name__ == '__main__':
         # Verificar se é uma Smart TV
         if is_smart_tv(request):
             # Para Smart TVs, enviar mensagem específica
-            socketio.emit('reloadPlayer', {
+            emit_players('reloadPlayer', {
                 'outdoor_id': outdoor_id,
                 'device_type': 'smart-tv'
-        }, broadcast=True)
+        })
         else:
-            socketio.emit('reloadPlayer', {'outdoor_id': outdoor_id})
+            emit_players('reloadPlayer', {'outdoor_id': outdoor_id})
         
         return jsonify({'message': 'Comando de recarregamento enviado'}), 200
 
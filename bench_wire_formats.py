@@ -0,0 +1,70 @@
+"""Compara bytes e CPU por resposta dos formatos da API e dos pacotes Socket.IO.
+
+Uso: python bench_wire_formats.py [quantidade_de_anuncios]
+"""
+import gzip
+import json
+import sys
+import time
+import uuid
+
+import msgpack
+from socketio.msgpack_packet import MsgPackPacket
+from socketio.packet import EVENT, Packet
+
+REPETICOES = 2000
+
+
+def playlist_exemplo(n):
+    return [{
+        '_id': str(uuid.uuid4()),
+        'titulo': f'Anúncio promocional {i}',
+        'tipo': 'video' if i % 3 else 'imagem',
+        'duracao': 30,
+        'arquivo': f'{uuid.uuid4()}_anuncio{i}.mp4',
+        'usuario': 'cliente.exemplo@gmail.com',
+        'data_criacao': '2025-05-17T18:35:58.067554',
+        'ultima_atualizacao': None,
+        'variantes': {}
+    } for i in range(n)]
+
+
+def medir(codificar):
+    corpo = codificar()
+    inicio = time.process_time()
+    for _ in range(REPETICOES):
+        codificar()
+    return len(corpo), (time.process_time() - inicio) / REPETICOES * 1e6
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    playlist = playlist_exemplo(n)
+    compacto = lambda: json.dumps(playlist, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    formatos = {
+        'json indentado': lambda: json.dumps(playlist, ensure_ascii=False, indent=2).encode('utf-8'),
+        'json compacto': compacto,
+        'json compacto + gzip': lambda: gzip.compress(compacto(), compresslevel=6, mtime=0),
+        'msgpack': lambda: msgpack.packb(playlist),
+        'msgpack + gzip': lambda: gzip.compress(msgpack.packb(playlist), compresslevel=6, mtime=0),
+    }
+    print(f'Playlist com {n} anúncios (bytes / µs de CPU por resposta)')
+    for nome, codificar in formatos.items():
+        tamanho, cpu = medir(codificar)
+        print(f'  {nome:24} {tamanho:8d} B {cpu:10.1f} µs')
+
+    eventos = [{'anuncio_id': a['_id'], 'outdoor_id': '2', 'inicio': 1760000000000 + i,
+                'duracao': 30.0, 'completo': True} for i, a in enumerate(playlist)]
+    pacotes = {
+        'outdoor_updated': ['outdoor_updated', {'outdoor_id': '2'}],
+        f'play_events ({n} eventos)': ['play_events', {'eventos': eventos}],
+    }
+    print('Pacotes Socket.IO (bytes / µs de CPU por pacote)')
+    for nome, data in pacotes.items():
+        for serializador, classe in (('texto', Packet), ('msgpack', MsgPackPacket)):
+            tamanho, cpu = medir(lambda: classe(EVENT, data=data).encode())
+            print(f'  {nome:28} {serializador:8} {tamanho:8d} B {cpu:10.1f} µs')
+
+
+if __name__ == '__main__':
+    main()